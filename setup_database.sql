@@ -27,9 +27,10 @@ CREATE TABLE learning_content (
 );
 
 -- Create index for fast vector similarity search
--- Using ivfflat index with cosine similarity
-CREATE INDEX ON learning_content USING ivfflat (embedding vector_cosine_ops)
-WITH (lists = 100);
+-- HNSW with cosine ops: unlike ivfflat it needs no training step, keeps
+-- recall high as the table grows, and probes O(log N) graph nodes per query
+CREATE INDEX ON learning_content USING hnsw (embedding vector_cosine_ops)
+WITH (m = 16, ef_construction = 64);
 
 -- User progress tracking
 -- Tracks each user's current learning week, topics, and goals
@@ -51,19 +52,30 @@ CREATE TABLE daily_insights (
     content_id INTEGER REFERENCES learning_content(id),
     relevance_score FLOAT,
     week INTEGER,
-    created_at TIMESTAMP DEFAULT NOW()
+    created_at TIMESTAMP DEFAULT NOW(),
+    -- Calendar date of the insight, maintained by Postgres; lets "today's
+    -- insights" queries hit an index with a single equality predicate.
+    -- created_at is a naive UTC timestamp, so the plain ::date cast is
+    -- immutable and allowed in a generated column
+    insight_date DATE GENERATED ALWAYS AS ((created_at)::date) STORED
 );
 
 -- Create indexes for faster queries
 CREATE INDEX idx_daily_insights_user_date ON daily_insights(user_id, created_at DESC);
+CREATE INDEX idx_daily_insights_user_insight_date ON daily_insights(user_id, insight_date);
 CREATE INDEX idx_content_sources_type ON content_sources(source_type);
 
 -- Function for vector similarity search
--- Returns content similar to the query embedding
+-- Returns content similar to the query embedding. The full content blob is
+-- only shipped when include_content is true; diagnostic callers that just
+-- need titles and similarities keep rows down to tens of bytes each.
+-- (If upgrading an existing database, DROP FUNCTION match_learning_content
+-- first: CREATE OR REPLACE cannot change the argument list.)
 CREATE OR REPLACE FUNCTION match_learning_content(
     query_embedding VECTOR(384),
     match_threshold FLOAT,
-    match_count INT
+    match_count INT,
+    include_content BOOLEAN DEFAULT FALSE
 )
 RETURNS TABLE (
     id INT,
@@ -78,7 +90,7 @@ AS $$
     SELECT
         id,
         title,
-        content,
+        CASE WHEN include_content THEN content ELSE NULL END AS content,
         source_url,
         metadata,
         1 - (embedding <=> query_embedding) AS similarity
@@ -2,11 +2,17 @@
 Content fetcher for ingesting learning content from various sources (RSS feeds, blogs, etc.)
 """
 
-import feedparser
+import asyncio
+import io
+
+import aiohttp
 import requests
-import ssl
-import certifi
-from bs4 import BeautifulSoup
+from cachetools import TTLCache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import threading
+from email.utils import parsedate_to_datetime
+from lxml import etree, html
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import logging
@@ -14,20 +20,123 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configure SSL context for feedparser to use certifi certificates
-if hasattr(ssl, '_create_unverified_context'):
-    ssl._create_default_https_context = ssl._create_unverified_context
+# XPath expressions compiled once at import time; per-call CSS selectors
+# would pay the CSS-to-XPath translation on every page
+H1_XPATH = etree.XPath("//h1")
+TITLE_XPATH = etree.XPath("//title")
+DESCRIPTION_XPATH = etree.XPath("//meta[@name='description']/@content")
+# Single union wrapped in (...)[1]: one tree traversal that stops at the
+# first container instead of materializing every match, with class tests
+# on whitespace-normalized token boundaries
+ARTICLE_XPATH = etree.XPath(
+    "(//article | //main"
+    " | //*[contains(concat(' ', normalize-space(@class), ' '), ' post-content ')"
+    " or contains(concat(' ', normalize-space(@class), ' '), ' entry-content ')"
+    " or contains(concat(' ', normalize-space(@class), ' '), ' article-content ')]"
+    " | //*[@id='content'])[1]"
+)
+DROP_TAGS_XPATH = etree.XPath(".//script | .//style | .//nav | .//footer")
+PARAGRAPH_XPATH = etree.XPath("//p")
+AUTHOR_XPATH = etree.XPath(
+    "//meta[@name='author']/@content"
+    " | //meta[@property='article:author']/@content"
+    " | (//*[contains(@class,'author')])[1]"
+)
+KEYWORDS_XPATH = etree.XPath("//meta[@name='keywords']/@content")
+
+# Feed XML namespaces
+ATOM_NS = "{http://www.w3.org/2005/Atom}"
+RSS1_NS = "{http://purl.org/rss/1.0/}"
+RSS_CONTENT_TAG = "{http://purl.org/rss/1.0/modules/content/}encoded"
+DC_CREATOR_TAG = "{http://purl.org/dc/elements/1.1/}creator"
+DC_DATE_TAG = "{http://purl.org/dc/elements/1.1/}date"
 
 
 class ContentFetcher:
     """Fetches and parses learning content from various sources."""
 
+    # Upper bound on blog page bytes; JS-bundled pages can run to tens of
+    # MB and balloon the parse tree well past that
+    MAX_BLOG_BYTES = 5_000_000
+
+    # Bounds for the conditional-GET cache; entries hold full parsed
+    # results, so cap how many URLs are kept and for how long
+    HTTP_CACHE_SIZE = 256
+    HTTP_CACHE_TTL = 86400
+
     def __init__(self):
         """Initialize content fetcher."""
         self.session = requests.Session()
         self.session.headers.update({
-            "User-Agent": "Mozilla/5.0 (Learning Coach Bot)"
+            "User-Agent": "Mozilla/5.0 (Learning Coach Bot)",
+            # Ask hosts for compressed payloads to shrink bytes over the wire
+            "Accept-Encoding": "gzip, deflate, br"
         })
+        # Keep-alive pool sized for bulk ingestion plus retry with backoff;
+        # the default adapter caps the pool at 10 and never retries
+        adapter = HTTPAdapter(
+            pool_connections=64,
+            pool_maxsize=64,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=(429, 500, 502, 503, 504)
+            )
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # aiohttp session for async feed fetches, created lazily so the
+        # constructor can run outside an event loop
+        self.aio_session: Optional[aiohttp.ClientSession] = None
+        # Per-URL ETag/Last-Modified validators plus the last parsed result,
+        # so unchanged sources answer 304 and skip download and parse.
+        # TTL-bounded: entries hold whole parsed feeds/articles, and an
+        # unbounded dict would grow for the life of the server
+        self._http_cache: TTLCache = TTLCache(
+            maxsize=self.HTTP_CACHE_SIZE,
+            ttl=self.HTTP_CACHE_TTL
+        )
+
+    def _conditional_headers(self, url: str) -> Dict[str, str]:
+        """Build If-None-Match/If-Modified-Since headers for a cached URL."""
+        cached = self._http_cache.get(url)
+        headers: Dict[str, str] = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        return headers
+
+    def _cached_result(self, url: str) -> Any:
+        """Return the last parsed result for a URL (valid after a 304)."""
+        cached = self._http_cache.get(url) or {}
+        return cached.get("result")
+
+    def _update_http_cache(self, url: str, response_headers: Any, result: Any) -> None:
+        """Remember validators and the parsed result for future conditional GETs."""
+        etag = response_headers.get("ETag")
+        last_modified = response_headers.get("Last-Modified")
+        if etag or last_modified:
+            self._http_cache[url] = {
+                "etag": etag,
+                "last_modified": last_modified,
+                "result": result
+            }
+
+    def _get_aio_session(self) -> aiohttp.ClientSession:
+        """Get or lazily create the shared aiohttp session."""
+        if self.aio_session is None or self.aio_session.closed:
+            self.aio_session = aiohttp.ClientSession(
+                headers={"User-Agent": "Mozilla/5.0 (Learning Coach Bot)"},
+                connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300)
+            )
+        return self.aio_session
+
+    async def aclose(self) -> None:
+        """Close the aiohttp session."""
+        if self.aio_session is not None and not self.aio_session.closed:
+            await self.aio_session.close()
 
     async def fetch_rss_feed(
         self,
@@ -45,26 +154,42 @@ class ContentFetcher:
             List of parsed feed items
         """
         try:
-            feed = feedparser.parse(feed_url)
-
-            if feed.bozo:
-                logger.warning(f"Feed parsing warning for {feed_url}: {feed.bozo_exception}")
+            # Download asynchronously so concurrent fetches overlap, then
+            # parse the already-downloaded bytes off the event loop
+            session = self._get_aio_session()
+            headers = self._conditional_headers(feed_url)
+            while True:
+                async with session.get(
+                    feed_url,
+                    timeout=aiohttp.ClientTimeout(total=10),
+                    headers=headers
+                ) as response:
+                    if response.status == 304 and headers:
+                        cached_items = self._cached_result(feed_url)
+                        if cached_items is not None:
+                            logger.info(f"Feed unchanged (304), using cached items for {feed_url}")
+                            return cached_items[:max_items]
+                        # Validators matched but the cached result was
+                        # evicted meanwhile; refetch unconditionally rather
+                        # than treating a live source as empty
+                        self._http_cache.pop(feed_url, None)
+                        headers = {}
+                        continue
+                    response.raise_for_status()
+                    response_headers = response.headers
+                    body = await response.read()
+                    break
+
+            entries = await asyncio.to_thread(self._iterparse_entries, body, max_items)
 
             items = []
-            for entry in feed.entries[:max_items]:
-                item = {
-                    "title": entry.get("title", ""),
-                    "link": entry.get("link", ""),
-                    "summary": entry.get("summary", ""),
-                    "content": self._extract_content(entry),
-                    "published": self._parse_date(entry),
-                    "author": entry.get("author", ""),
-                    "tags": self._extract_tags(entry),
-                    "source_type": "rss",
-                    "source_url": feed_url
-                }
+            for entry in entries:
+                item = dict(entry)
+                item["source_type"] = "rss"
+                item["source_url"] = feed_url
                 items.append(item)
 
+            self._update_http_cache(feed_url, response_headers, items)
             logger.info(f"Fetched {len(items)} items from {feed_url}")
             return items
 
@@ -86,157 +211,273 @@ class ContentFetcher:
             Parsed blog post data
         """
         try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-
-            soup = BeautifulSoup(response.content, "html.parser")
+            response = self.session.get(
+                url,
+                timeout=10,
+                stream=True,
+                headers=self._conditional_headers(url)
+            )
+            if response.status_code == 304:
+                cached_item = self._cached_result(url)
+                if cached_item is not None:
+                    response.close()
+                    logger.info(f"Blog post unchanged (304), using cached item for {url}")
+                    return cached_item
+                # Validators matched but the cached result was evicted
+                # meanwhile; refetch unconditionally rather than dropping
+                # the post for this cycle
+                self._http_cache.pop(url, None)
+                response.close()
+                response = self.session.get(url, timeout=10, stream=True)
+
+            # Streamed responses hold their pool slot until closed, so
+            # every exit path — including the early rejections and the
+            # byte-cap break — must release the connection
+            with response:
+                response.raise_for_status()
+
+                # Reject non-HTML and oversized pages before parsing anything
+                content_type = response.headers.get("Content-Type", "")
+                if content_type and "html" not in content_type:
+                    logger.warning(f"Skipping non-HTML response from {url}: {content_type}")
+                    return None
+
+                content_length = response.headers.get("Content-Length", "")
+                if content_length.isdigit() and int(content_length) > self.MAX_BLOG_BYTES:
+                    logger.warning(f"Skipping oversized page {url}: {content_length} bytes")
+                    return None
+
+                # Read with a byte cap in case Content-Length was absent or lied
+                buf = bytearray()
+                for chunk in response.iter_content(65536):
+                    buf.extend(chunk)
+                    if len(buf) > self.MAX_BLOG_BYTES:
+                        logger.warning(f"Truncating page {url} at {self.MAX_BLOG_BYTES} bytes")
+                        break
+
+                response_headers = response.headers
+
+            # Parse once; every helper reuses the same tree
+            doc = html.fromstring(bytes(buf))
 
             # Extract title
             title = ""
-            title_tag = soup.find("h1") or soup.find("title")
-            if title_tag:
-                title = title_tag.get_text(strip=True)
-
-            # Extract main content
-            content = self._extract_article_content(soup)
+            title_nodes = H1_XPATH(doc) or TITLE_XPATH(doc)
+            if title_nodes:
+                title = title_nodes[0].text_content().strip()
 
             # Extract metadata
-            meta_description = ""
-            meta_tag = soup.find("meta", attrs={"name": "description"})
-            if meta_tag:
-                meta_description = meta_tag.get("content", "")
+            descriptions = DESCRIPTION_XPATH(doc)
+            meta_description = descriptions[0].strip() if descriptions else ""
 
-            return {
+            # Extract main content
+            content = self._extract_article_content(doc)
+
+            item = {
                 "title": title,
                 "link": url,
                 "summary": meta_description,
                 "content": content,
                 "published": datetime.utcnow().isoformat(),
-                "author": self._extract_author(soup),
-                "tags": self._extract_meta_tags(soup),
+                "author": self._extract_author(doc),
+                "tags": self._extract_meta_tags(doc),
                 "source_type": "blog",
                 "source_url": url
             }
+            self._update_http_cache(url, response_headers, item)
+            return item
 
         except Exception as e:
             logger.error(f"Error fetching blog post {url}: {str(e)}")
             return None
 
-    def _extract_content(self, entry: Any) -> str:
-        """Extract content from RSS entry."""
-        if hasattr(entry, "content"):
-            return entry.content[0].value
-        elif hasattr(entry, "summary"):
-            return entry.summary
-        elif hasattr(entry, "description"):
-            return entry.description
-        return ""
+    def _iterparse_entries(self, body: bytes, max_items: int) -> List[Dict[str, Any]]:
+        """
+        Stream-parse feed bytes, stopping after max_items entries.
 
-    def _extract_article_content(self, soup: BeautifulSoup) -> str:
+        Only the first max_items <item>/<entry> elements are materialized;
+        processed elements and their preceding siblings are freed as we go,
+        so peak memory stays at one entry rather than the whole feed.
+        """
+        entries = []
+        context = etree.iterparse(
+            io.BytesIO(body),
+            events=("end",),
+            tag=("item", f"{RSS1_NS}item", f"{ATOM_NS}entry"),
+            recover=True
+        )
+
+        for _, elem in context:
+            if elem.tag == f"{ATOM_NS}entry":
+                entries.append(self._parse_atom_entry(elem))
+            else:
+                entries.append(self._parse_rss_item(elem))
+
+            # Free the processed entry and everything before it
+            elem.clear()
+            parent = elem.getparent()
+            while elem.getprevious() is not None:
+                del parent[0]
+
+            if len(entries) >= max_items:
+                break
+
+        return entries
+
+    def _parse_rss_item(self, elem: etree._Element) -> Dict[str, Any]:
+        """Build an item dict from an RSS 2.0 or RSS 1.0/RDF <item> element."""
+        # RSS 1.0 (RDF) feeds like Slashdot put item children in the RSS 1.0
+        # namespace; RSS 2.0 leaves them unprefixed
+        ns = RSS1_NS if elem.tag.startswith(RSS1_NS) else ""
+
+        summary = (elem.findtext(f"{ns}description") or "").strip()
+        content = (elem.findtext(RSS_CONTENT_TAG) or "").strip() or summary
+        author = (elem.findtext(f"{ns}author") or elem.findtext(DC_CREATOR_TAG) or "").strip()
+        tags = [c.text.strip() for c in elem.findall(f"{ns}category") if c.text]
+        # RSS 1.0 carries the date as dc:date rather than pubDate
+        published = elem.findtext(f"{ns}pubDate") or elem.findtext(DC_DATE_TAG)
+
+        return {
+            "title": (elem.findtext(f"{ns}title") or "").strip(),
+            "link": (elem.findtext(f"{ns}link") or "").strip(),
+            "summary": summary,
+            "content": content,
+            "published": self._parse_date(published),
+            "author": author,
+            "tags": tags
+        }
+
+    def _parse_atom_entry(self, elem: etree._Element) -> Dict[str, Any]:
+        """Build an item dict from an Atom <entry> element."""
+        link = ""
+        for link_elem in elem.findall(f"{ATOM_NS}link"):
+            if link_elem.get("rel") in (None, "alternate"):
+                link = link_elem.get("href", "")
+                break
+
+        summary = (elem.findtext(f"{ATOM_NS}summary") or "").strip()
+        content = (elem.findtext(f"{ATOM_NS}content") or "").strip() or summary
+        published = elem.findtext(f"{ATOM_NS}published") or elem.findtext(f"{ATOM_NS}updated")
+        tags = [c.get("term") for c in elem.findall(f"{ATOM_NS}category") if c.get("term")]
+
+        return {
+            "title": (elem.findtext(f"{ATOM_NS}title") or "").strip(),
+            "link": link,
+            "summary": summary,
+            "content": content,
+            "published": self._parse_date(published),
+            "author": (elem.findtext(f"{ATOM_NS}author/{ATOM_NS}name") or "").strip(),
+            "tags": tags
+        }
+
+    def _extract_article_content(self, doc: html.HtmlElement) -> str:
         """
         Extract main article content from HTML.
         Looks for common article containers.
         """
-        # Try common article selectors
-        selectors = [
-            "article",
-            "main",
-            ".post-content",
-            ".entry-content",
-            ".article-content",
-            "#content"
-        ]
-
-        for selector in selectors:
-            article = soup.select_one(selector)
-            if article:
-                # Remove script and style tags
-                for tag in article.find_all(["script", "style", "nav", "footer"]):
-                    tag.decompose()
-                return article.get_text(separator="\n", strip=True)
+        articles = ARTICLE_XPATH(doc)
+        if articles:
+            article = articles[0]
+            # Remove script and style tags
+            for tag in DROP_TAGS_XPATH(article):
+                tag.getparent().remove(tag)
+            return "\n".join(
+                line for line in (text.strip() for text in article.itertext()) if line
+            )
 
         # Fallback: get all paragraph text
-        paragraphs = soup.find_all("p")
-        return "\n".join(p.get_text(strip=True) for p in paragraphs)
+        return "\n".join(p.text_content().strip() for p in PARAGRAPH_XPATH(doc))
 
-    def _extract_author(self, soup: BeautifulSoup) -> str:
+    def _extract_author(self, doc: html.HtmlElement) -> str:
         """Extract author from HTML."""
-        # Try common author selectors
-        author_selectors = [
-            'meta[name="author"]',
-            'meta[property="article:author"]',
-            ".author",
-            ".author-name"
-        ]
-
-        for selector in author_selectors:
-            author_tag = soup.select_one(selector)
-            if author_tag:
-                if author_tag.name == "meta":
-                    return author_tag.get("content", "")
-                return author_tag.get_text(strip=True)
-
+        authors = AUTHOR_XPATH(doc)
+        if authors:
+            author = authors[0]
+            # Meta branches yield attribute strings, class branches yield elements
+            if isinstance(author, str):
+                return author.strip()
+            return author.text_content().strip()
         return ""
 
-    def _extract_tags(self, entry: Any) -> List[str]:
-        """Extract tags from RSS entry."""
-        tags = []
-        if hasattr(entry, "tags"):
-            tags = [tag.term for tag in entry.tags if hasattr(tag, "term")]
-        return tags
-
-    def _extract_meta_tags(self, soup: BeautifulSoup) -> List[str]:
+    def _extract_meta_tags(self, doc: html.HtmlElement) -> List[str]:
         """Extract tags/keywords from HTML meta tags."""
-        keywords_tag = soup.find("meta", attrs={"name": "keywords"})
-        if keywords_tag:
-            keywords = keywords_tag.get("content", "")
-            return [k.strip() for k in keywords.split(",")]
+        keywords = KEYWORDS_XPATH(doc)
+        if keywords:
+            return [k.strip() for k in keywords[0].split(",")]
         return []
 
-    def _parse_date(self, entry: Any) -> str:
-        """Parse publication date from RSS entry."""
-        if hasattr(entry, "published_parsed") and entry.published_parsed:
-            return datetime(*entry.published_parsed[:6]).isoformat()
-        elif hasattr(entry, "updated_parsed") and entry.updated_parsed:
-            return datetime(*entry.updated_parsed[:6]).isoformat()
+    def _parse_date(self, value: Optional[str]) -> str:
+        """Parse an RFC 822 or ISO 8601 feed date into ISO format."""
+        if value:
+            value = value.strip()
+            try:
+                return parsedate_to_datetime(value).isoformat()
+            except (TypeError, ValueError):
+                pass
+            try:
+                if value.endswith("Z"):
+                    value = value[:-1] + "+00:00"
+                return datetime.fromisoformat(value).isoformat()
+            except ValueError:
+                pass
         return datetime.utcnow().isoformat()
 
     async def fetch_multiple_sources(
         self,
-        sources: List[Dict[str, str]]
+        sources: List[Dict[str, str]],
+        concurrency: int = 20
     ) -> List[Dict[str, Any]]:
         """
-        Fetch content from multiple sources.
+        Fetch content from multiple sources concurrently.
 
         Args:
             sources: List of source dicts with 'source_url' and 'source_type' keys
+            concurrency: Maximum number of in-flight fetches
 
         Returns:
             Combined list of content items
         """
-        all_content = []
+        semaphore = asyncio.Semaphore(concurrency)
 
-        for source in sources:
+        async def fetch_one(source: Dict[str, str]) -> Any:
             url = source.get("source_url", "")
             source_type = source.get("source_type", "rss")
 
-            if source_type == "rss":
-                items = await self.fetch_rss_feed(url)
-                all_content.extend(items)
-            elif source_type == "blog":
-                item = await self.fetch_blog_post(url)
-                if item:
-                    all_content.append(item)
+            async with semaphore:
+                if source_type == "rss":
+                    return await self.fetch_rss_feed(url)
+                elif source_type == "blog":
+                    return await self.fetch_blog_post(url)
+                return None
+
+        # Overlap all network round-trips instead of paying them serially
+        results = await asyncio.gather(
+            *(fetch_one(source) for source in sources),
+            return_exceptions=True
+        )
+
+        all_content = []
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Error fetching source: {str(result)}")
+            elif isinstance(result, list):
+                all_content.extend(result)
+            elif result:
+                all_content.append(result)
 
         return all_content
 
 
-# Singleton instance
+# Singleton instance, double-checked locking so concurrent first requests
+# cannot construct two fetchers
 _content_fetcher: Optional[ContentFetcher] = None
+_content_fetcher_lock = threading.Lock()
 
 def get_content_fetcher() -> ContentFetcher:
-    """Get or create ContentFetcher instance."""
+    """Get or create ContentFetcher instance (thread-safe)."""
     global _content_fetcher
     if _content_fetcher is None:
-        _content_fetcher = ContentFetcher()
+        with _content_fetcher_lock:
+            if _content_fetcher is None:
+                _content_fetcher = ContentFetcher()
     return _content_fetcher
@@ -2,10 +2,17 @@
 RAG pipeline for generating personalized daily learning digests using vector embeddings and RAGAS.
 """
 
+import asyncio
+import bisect
+import hashlib
 import os
+import threading
 from typing import List, Dict, Any, Optional
-from datetime import datetime
+from datetime import datetime, timezone
+import numpy as np
+from cachetools import TTLCache
 from sentence_transformers import SentenceTransformer
+from sentence_transformers.quantization import quantize_embeddings
 import logging
 
 from ..utils.database import get_db_client
@@ -19,6 +26,26 @@ logger = logging.getLogger(__name__)
 class DigestGenerator:
     """Generates personalized daily learning digests using RAG."""
 
+    # Bounds for the content-hash -> embedding cache; entries expire after
+    # a day so long-running servers don't pin stale vectors forever
+    EMBEDDING_CACHE_SIZE = 10_000
+    EMBEDDING_CACHE_TTL = 86400
+
+    # Number of texts encoded per model forward in batch encodes
+    EMBED_BATCH_SIZE = 32
+
+    # Freshness decay tiers: content up to N days old (upper bounds) maps
+    # onto the corresponding score; older than the last bound gets 0.2
+    FRESHNESS_DAYS = (0, 7, 30, 90)
+    FRESHNESS_SCORES = (1.0, 0.9, 0.7, 0.4, 0.2)
+
+    # Fixed per-dimension calibration bounds for int8 quantization. The
+    # embeddings are L2-normalized so every component lies in [-1, 1];
+    # sharing one range across all calls keeps vectors quantized in
+    # different batches (and query vectors) mutually comparable, where
+    # per-batch calibration would silently corrupt similarity search
+    INT8_CALIBRATION_RANGE = (-1.0, 1.0)
+
     def __init__(self):
         """Initialize the digest generator."""
         self.db = get_db_client()
@@ -27,10 +54,80 @@ class DigestGenerator:
 
         # Load embedding model
         model_name = os.getenv("DEFAULT_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
-        logger.info(f"Loading embedding model: {model_name}")
-        self.embedding_model = SentenceTransformer(model_name)
+        backend = os.getenv("EMBEDDING_BACKEND", "sentence-transformers")
+
+        if backend == "fastembed":
+            # ONNX Runtime backend: quantized CPU kernels, no torch import
+            from fastembed import TextEmbedding
+
+            logger.info(f"Loading fastembed ONNX model: {model_name}")
+            self._fastembed: Optional[Any] = TextEmbedding(model_name)
+            self.embedding_model: Optional[SentenceTransformer] = None
+        else:
+            logger.info(f"Loading embedding model: {model_name}")
+            self._fastembed = None
+            self.embedding_model = SentenceTransformer(model_name)
+
+        # Storage precision for embeddings: float32 (default), float16, or int8.
+        # The pgvector VECTOR column stores float4, so int8 needs a schema
+        # migration to an int8/bytea column before it can be enabled.
+        self.embedding_precision = os.getenv("EMBEDDING_PRECISION", "float32")
+
+        # Content-hash cache so re-ingested items and repeated queries skip
+        # the encoder forward pass entirely. TTLCache is not thread-safe
+        # and embeds run via asyncio.to_thread from several call sites at
+        # once, so every access goes through the lock
+        self._embedding_cache: TTLCache = TTLCache(
+            maxsize=self.EMBEDDING_CACHE_SIZE,
+            ttl=self.EMBEDDING_CACHE_TTL
+        )
+        self._embedding_cache_lock = threading.Lock()
+
+        # Let the Groq client reuse responses for near-identical prompts
+        self.groq.set_prompt_embedder(self.generate_embedding)
+
+    def _cache_key(self, text: str) -> bytes:
+        """Hash text into a compact embedding-cache key."""
+        return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+    def _cache_embedding(self, key: bytes, embedding: np.ndarray) -> None:
+        """Store an embedding; TTLCache handles size and age eviction."""
+        with self._embedding_cache_lock:
+            self._embedding_cache[key] = embedding
+
+    def _quantize(self, embeddings: np.ndarray) -> np.ndarray:
+        """Quantize embeddings to the configured precision before storage."""
+        if self.embedding_precision == "float16":
+            # Halves vector bytes with negligible recall loss for MiniLM
+            return embeddings.astype(np.float16)
+        if self.embedding_precision == "int8":
+            single = embeddings.ndim == 1
+            batch = np.atleast_2d(embeddings)
+            # Without explicit ranges quantize_embeddings calibrates from
+            # the batch itself: a single vector has min == max per
+            # dimension (divide-by-zero -> NaN), and per-batch ranges vary
+            # between calls, so always pass the fixed shared range
+            ranges = np.tile(
+                np.array(self.INT8_CALIBRATION_RANGE, dtype=np.float32)[:, np.newaxis],
+                (1, batch.shape[1])
+            )
+            quantized = quantize_embeddings(batch, precision="int8", ranges=ranges)
+            return quantized[0] if single else quantized
+        return embeddings
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts with the configured backend into an (N, D) array."""
+        if self._fastembed is not None:
+            return np.asarray(list(self._fastembed.embed(texts, batch_size=self.EMBED_BATCH_SIZE)))
+        return self.embedding_model.encode(
+            texts,
+            batch_size=self.EMBED_BATCH_SIZE,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
 
-    def generate_embedding(self, text: str) -> List[float]:
+    def generate_embedding(self, text: str) -> np.ndarray:
         """
         Generate vector embedding for text.
 
@@ -38,10 +135,46 @@ class DigestGenerator:
             text: Input text
 
         Returns:
-            Vector embedding as list of floats
+            Vector embedding as a numpy array; callers that need JSON
+            serialization convert at the edge only
+        """
+        key = self._cache_key(text)
+        with self._embedding_cache_lock:
+            cached = self._embedding_cache.get(key)
+        if cached is not None:
+            return cached
+
+        embedding = self._quantize(self._encode([text])[0])
+        self._cache_embedding(key, embedding)
+        return embedding
+
+    def generate_embeddings_batch(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Generate embeddings for many texts efficiently.
+
+        Sorts by length so each micro-batch pads its sequences to similar
+        lengths instead of the batch maximum, encodes in fixed-size
+        windows, then restores the caller's order.
+
+        Args:
+            texts: Input texts
+
+        Returns:
+            One embedding per text, in input order
         """
-        embedding = self.embedding_model.encode(text, convert_to_numpy=True)
-        return embedding.tolist()
+        if not texts:
+            return []
+
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        embeddings: List[Optional[np.ndarray]] = [None] * len(texts)
+
+        for start in range(0, len(order), self.EMBED_BATCH_SIZE):
+            window = order[start:start + self.EMBED_BATCH_SIZE]
+            encoded = self._quantize(self._encode([texts[i] for i in window]))
+            for i, embedding in zip(window, encoded):
+                embeddings[i] = embedding
+
+        return embeddings
 
     async def ingest_content_with_embeddings(
         self,
@@ -58,34 +191,72 @@ class DigestGenerator:
         """
         stored_items = []
 
-        for item in content_items:
+        if not content_items:
+            return stored_items
+
+        # Combine title and content, then encode the whole batch in one
+        # forward pass instead of paying per-item dispatch overhead
+        texts = [f"{item.get('title', '')}\n\n{item.get('content', '')}" for item in content_items]
+        keys = [self._cache_key(text) for text in texts]
+
+        # Dedupe against the cache and within the batch so each distinct
+        # text costs at most one forward pass. The batch's vectors live in
+        # a local dict: the shared cache can evict entries at any time
+        # (batches larger than its capacity, concurrent ingests), so it
+        # cannot be re-read for values written moments ago
+        batch_embeddings: Dict[bytes, np.ndarray] = {}
+        to_encode: Dict[bytes, str] = {}
+        with self._embedding_cache_lock:
+            for key, text in zip(keys, texts):
+                if key in batch_embeddings or key in to_encode:
+                    continue
+                cached = self._embedding_cache.get(key)
+                if cached is not None:
+                    batch_embeddings[key] = cached
+                else:
+                    to_encode[key] = text
+
+        if to_encode:
+            # Run the model forwards in a worker thread so DB writes and
+            # other coroutines keep progressing while we encode
+            encoded = await asyncio.to_thread(
+                self.generate_embeddings_batch,
+                list(to_encode.values())
+            )
+            for key, embedding in zip(to_encode, encoded):
+                batch_embeddings[key] = embedding
+                self._cache_embedding(key, embedding)
+
+        embeddings = [batch_embeddings[key] for key in keys]
+
+        rows = []
+        for item, embedding in zip(content_items, embeddings):
             try:
-                # Combine title and content for embedding
-                text_for_embedding = f"{item['title']}\n\n{item['content']}"
-
-                # Generate embedding
-                embedding = self.generate_embedding(text_for_embedding)
-
-                # Store in database
-                stored_item = await self.db.store_content(
-                    title=item["title"],
-                    content=item["content"],
-                    source_url=item["link"],
-                    embedding=embedding,
-                    metadata={
+                rows.append({
+                    "title": item["title"],
+                    "content": item["content"],
+                    "source_url": item["link"],
+                    "embedding": embedding,
+                    "metadata": {
                         "summary": item.get("summary", ""),
                         "author": item.get("author", ""),
                         "published": item.get("published", ""),
                         "tags": item.get("tags", []),
-                        "source_type": item.get("source_type", "")
+                        "source_type": item.get("source_type", ""),
+                        # Prompt-sized slice stored once at ingest so insight
+                        # generation doesn't re-truncate the full article
+                        "content_snippet": item["content"][:1000]
                     }
-                )
-
-                stored_items.append(stored_item)
-                logger.info(f"Ingested content: {item['title'][:50]}...")
+                })
+            except KeyError as e:
+                logger.error(f"Skipping content '{item.get('title', 'Unknown')}' missing field: {str(e)}")
 
-            except Exception as e:
-                logger.error(f"Error ingesting content '{item.get('title', 'Unknown')}': {str(e)}")
+        try:
+            # One bulk insert instead of a round-trip per item
+            stored_items = await self.db.store_content_bulk(rows)
+            logger.info(f"Ingested {len(stored_items)} content items")
+        except Exception as e:
+            logger.error(f"Error ingesting content batch: {str(e)}")
 
         return stored_items
 
@@ -104,9 +275,10 @@ class DigestGenerator:
         Returns:
             List of relevant content items
         """
-        # Create query from user's topics
+        # Create query from user's topics; sorting canonicalizes the text so
+        # reordered topic lists hit the same cached embedding
         topics = user_context.get("current_topics", [])
-        query_text = " ".join(topics)
+        query_text = " ".join(sorted(topics))
 
         if not query_text:
             logger.warning("No topics provided for content retrieval")
@@ -115,28 +287,31 @@ class DigestGenerator:
         logger.info(f"Searching for content with topics: {topics}")
         logger.info(f"Query text: {query_text}")
 
-        # Generate query embedding
-        query_embedding = self.generate_embedding(query_text)
+        # Generate query embedding off the event loop
+        query_embedding = await asyncio.to_thread(self.generate_embedding, query_text)
         logger.info(f"Generated query embedding with dimension: {len(query_embedding)}")
 
-        # Search database with reasonable threshold
+        # Single round-trip at the permissive threshold, then prefer the
+        # stricter slice client-side instead of paying a second query when
+        # the strict threshold comes back empty
         # Note: Typical semantic similarity scores range from 0.3-0.8 for related content
-        relevant_content = await self.db.search_content_by_embedding(
+        candidates = await self.db.search_content_by_embedding(
             query_embedding=query_embedding,
-            limit=top_k,
-            similarity_threshold=0.25  # Lowered from 0.6 to capture more relevant content
+            limit=top_k * 3,
+            similarity_threshold=0.15,
+            # Insight generation reads item["content"], so this caller pays
+            # for the full blob; diagnostic callers leave it off
+            include_content=True
         )
 
-        logger.info(f"Retrieved {len(relevant_content)} relevant content items")
-        if len(relevant_content) == 0:
-            logger.warning("No content found with similarity threshold 0.25")
-            logger.warning("Trying with very low threshold 0.15...")
-            relevant_content = await self.db.search_content_by_embedding(
-                query_embedding=query_embedding,
-                limit=top_k,
-                similarity_threshold=0.15  # Lowered from 0.3 as fallback
-            )
-            logger.info(f"Retrieved {len(relevant_content)} items with lower threshold")
+        # Results arrive sorted by similarity, so slicing keeps the best
+        strict = [c for c in candidates if c.get("similarity", 0) >= 0.25][:top_k]
+        relevant_content = strict or candidates[:top_k]
+
+        logger.info(
+            f"Retrieved {len(relevant_content)} relevant content items "
+            f"({len(candidates)} candidates above 0.15)"
+        )
 
         return relevant_content
 
@@ -157,59 +332,97 @@ class DigestGenerator:
         Returns:
             List of generated insights with metadata
         """
-        insights = []
+        # Cap concurrent Groq requests to stay within rate limits
+        semaphore = asyncio.Semaphore(4)
 
-        for i, item in enumerate(content_items[:max_insights]):
-            try:
-                # Generate insight using Groq
+        # One clock read shared by every freshness computation in the batch
+        now = datetime.now(timezone.utc)
+
+        # The learner-context prompt header is the same for every insight in
+        # this batch; render it once instead of per call
+        context_header = self.groq.build_insight_header(user_context)
+
+        items = content_items[:max_insights]
+
+        # One fused JSON-mode call scores relevance and extracts key
+        # concepts for every candidate instead of per-item round-trips.
+        # A transient failure here costs the scores, not the digest
+        try:
+            analyses = await self.groq.analyze_content(
+                contents=[item["content"] for item in items],
+                user_topics=user_context.get("current_topics", [])
+            )
+        except Exception as e:
+            logger.error(f"Error batch-analyzing content, using default scores: {str(e)}")
+            analyses = [{"score": 0.5, "concepts": []} for _ in items]
+
+        async def generate_one(item: Dict[str, Any], analysis: Dict[str, Any]) -> Dict[str, Any]:
+            # Prefer the prompt-sized snippet stored at ingest time
+            snippet = item.get("metadata", {}).get("content_snippet") or item["content"]
+
+            async with semaphore:
                 insight_text = await self.groq.generate_insight(
-                    content=item["content"],
-                    user_context=user_context
+                    content=snippet,
+                    context_header=context_header
                 )
 
-                # Score relevance
-                relevance_score = await self._calculate_relevance_score(
-                    item=item,
-                    user_context=user_context
-                )
+            relevance_score = self._calculate_relevance_score(
+                item=item,
+                topic_relevance=analysis["score"],
+                now=now
+            )
+
+            metadata = dict(item.get("metadata") or {})
+            if analysis["concepts"]:
+                metadata["key_concepts"] = analysis["concepts"]
+
+            return {
+                "insight": insight_text,
+                "content_id": item.get("id"),
+                "title": item.get("title", ""),
+                "source_url": item.get("source_url", ""),
+                "relevance_score": relevance_score,
+                "similarity_score": item.get("similarity", 0.0),
+                "metadata": metadata
+            }
 
-                insight = {
-                    "insight": insight_text,
-                    "content_id": item.get("id"),
-                    "title": item.get("title", ""),
-                    "source_url": item.get("source_url", ""),
-                    "relevance_score": relevance_score,
-                    "similarity_score": item.get("similarity", 0.0),
-                    "metadata": item.get("metadata", {})
-                }
+        results = await asyncio.gather(
+            *(generate_one(item, analysis) for item, analysis in zip(items, analyses)),
+            return_exceptions=True
+        )
 
-                insights.append(insight)
-                logger.info(f"Generated insight {i+1}/{max_insights}")
+        insights = []
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Error generating insight from content: {str(result)}")
+            else:
+                insights.append(result)
 
-            except Exception as e:
-                logger.error(f"Error generating insight from content: {str(e)}")
+        logger.info(f"Generated {len(insights)}/{min(len(content_items), max_insights)} insights")
 
         # Sort by relevance score
         insights.sort(key=lambda x: x["relevance_score"], reverse=True)
 
         return insights
 
-    async def _calculate_relevance_score(
+    def _calculate_relevance_score(
         self,
         item: Dict[str, Any],
-        user_context: Dict[str, Any]
+        topic_relevance: float,
+        now: Optional[datetime] = None
     ) -> float:
         """
         Calculate relevance score using RAGAS-inspired metrics.
 
         Combines:
         - Semantic similarity score
-        - Topic relevance from Groq
+        - Topic relevance (batch-scored by Groq upfront)
         - Freshness (newer content scores higher)
 
         Args:
             item: Content item
-            user_context: User context
+            topic_relevance: Pre-computed topic relevance for this item
+            now: Reference time for freshness, shared across a batch
 
         Returns:
             Combined relevance score (0.0 to 1.0)
@@ -217,16 +430,10 @@ class DigestGenerator:
         # Semantic similarity (from vector search)
         similarity_score = item.get("similarity", 0.5)
 
-        # Topic relevance from Groq
-        topics = user_context.get("current_topics", [])
-        topic_relevance = await self.groq.score_content_relevance(
-            content=item["content"][:500],
-            user_topics=topics
-        )
-
         # Freshness score (decay over time)
         freshness_score = self._calculate_freshness(
-            item.get("metadata", {}).get("published", "")
+            item.get("metadata", {}).get("published", ""),
+            now=now
         )
 
         # Weighted combination
@@ -238,27 +445,24 @@ class DigestGenerator:
 
         return round(relevance_score, 3)
 
-    def _calculate_freshness(self, published_date: str) -> float:
+    def _calculate_freshness(self, published_date: str, now: Optional[datetime] = None) -> float:
         """Calculate freshness score based on publication date."""
         if not published_date:
             return 0.5
 
         try:
-            pub_date = datetime.fromisoformat(published_date.replace("Z", "+00:00"))
-            now = datetime.utcnow()
+            if published_date.endswith("Z"):
+                published_date = published_date[:-1] + "+00:00"
+            pub_date = datetime.fromisoformat(published_date)
+            if pub_date.tzinfo is None:
+                pub_date = pub_date.replace(tzinfo=timezone.utc)
+
+            if now is None:
+                now = datetime.now(timezone.utc)
             days_old = (now - pub_date).days
 
-            # Exponential decay: 1.0 for today, 0.5 for 30 days, 0.1 for 90+ days
-            if days_old <= 0:
-                return 1.0
-            elif days_old <= 7:
-                return 0.9
-            elif days_old <= 30:
-                return 0.7
-            elif days_old <= 90:
-                return 0.4
-            else:
-                return 0.2
+            # Decay tier lookup: 1.0 for today down to 0.2 for 90+ days
+            return self.FRESHNESS_SCORES[bisect.bisect_left(self.FRESHNESS_DAYS, days_old)]
 
         except Exception:
             return 0.5
@@ -332,12 +536,16 @@ class DigestGenerator:
         }
 
 
-# Singleton instance
+# Singleton instance, double-checked locking so two racing first requests
+# cannot both load the multi-hundred-MB embedding model
 _digest_generator: Optional[DigestGenerator] = None
+_digest_generator_lock = threading.Lock()
 
 def get_digest_generator() -> DigestGenerator:
-    """Get or create DigestGenerator instance."""
+    """Get or create DigestGenerator instance (thread-safe)."""
     global _digest_generator
     if _digest_generator is None:
-        _digest_generator = DigestGenerator()
+        with _digest_generator_lock:
+            if _digest_generator is None:
+                _digest_generator = DigestGenerator()
     return _digest_generator
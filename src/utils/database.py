@@ -2,14 +2,35 @@
 Supabase database client with pgvector support for the Learning Coach MCP server.
 """
 
+import asyncio
 import os
-from typing import List, Dict, Any, Optional
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Last (epoch second, formatted timestamp) pair for _utcnow_iso
+_timestamp_cache: Tuple[int, str] = (0, "")
+
+
+def _utcnow_iso() -> str:
+    """
+    Current UTC time in ISO format, memoized per second.
+
+    Every insert stamps created_at/updated_at; during bulk ingestion the
+    repeated datetime formatting is measurable, and rows stamped within
+    the same second sharing a timestamp also simplifies dedup downstream.
+    """
+    global _timestamp_cache
+    second = int(time.time())
+    if _timestamp_cache[0] != second:
+        _timestamp_cache = (second, datetime.utcnow().isoformat())
+    return _timestamp_cache[1]
+
 
 class SupabaseClient:
     """Manages interactions with Supabase database."""
@@ -24,6 +45,16 @@ class SupabaseClient:
 
         self.client: Client = create_client(self.url, self.key)
 
+    async def _run(self, fn):
+        """
+        Run a blocking supabase-py call in the default executor.
+
+        supabase-py issues synchronous HTTP requests; calling them directly
+        from a coroutine would stall the event loop for the round-trip and
+        serialize every concurrent tool invocation.
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, fn)
+
     # Content Sources Management
     async def add_content_source(
         self,
@@ -36,20 +67,23 @@ class SupabaseClient:
             "source_url": source_url,
             "source_type": source_type,
             "tags": tags or [],
-            "created_at": datetime.utcnow().isoformat()
+            "created_at": _utcnow_iso()
         }
 
-        result = self.client.table("content_sources").insert(data).execute()
+        result = await self._run(
+            lambda: self.client.table("content_sources").insert(data).execute()
+        )
         return result.data[0] if result.data else {}
 
     async def get_content_sources(self, source_type: Optional[str] = None) -> List[Dict[str, Any]]:
         """Retrieve all content sources or filter by type."""
-        query = self.client.table("content_sources").select("*")
-
-        if source_type:
-            query = query.eq("source_type", source_type)
+        def run_query():
+            query = self.client.table("content_sources").select("*")
+            if source_type:
+                query = query.eq("source_type", source_type)
+            return query.execute()
 
-        result = query.execute()
+        result = await self._run(run_query)
         return result.data
 
     # Learning Content Storage
@@ -58,38 +92,83 @@ class SupabaseClient:
         title: str,
         content: str,
         source_url: str,
-        embedding: List[float],
+        embedding: Any,
         metadata: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
-        """Store learning content with vector embedding."""
+        """Store learning content with vector embedding (numpy array or list)."""
         data = {
             "title": title,
             "content": content,
             "source_url": source_url,
-            "embedding": embedding,
+            # Serialize numpy arrays at this edge only; upstream code stays
+            # on contiguous float arrays instead of boxed Python floats
+            "embedding": embedding.tolist() if hasattr(embedding, "tolist") else embedding,
             "metadata": metadata or {},
-            "created_at": datetime.utcnow().isoformat()
+            "created_at": _utcnow_iso()
         }
 
-        result = self.client.table("learning_content").insert(data).execute()
+        result = await self._run(
+            lambda: self.client.table("learning_content").insert(data).execute()
+        )
         return result.data[0] if result.data else {}
 
+    async def store_content_bulk(
+        self,
+        rows: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Store multiple learning content rows in a single insert.
+
+        Each row needs title, content, source_url, embedding, and optional
+        metadata; one PostgREST round-trip covers the whole batch.
+        """
+        if not rows:
+            return []
+
+        created_at = _utcnow_iso()
+        data = [
+            {
+                "title": row["title"],
+                "content": row["content"],
+                "source_url": row.get("source_url", ""),
+                "embedding": row["embedding"].tolist() if hasattr(row["embedding"], "tolist") else row["embedding"],
+                "metadata": row.get("metadata") or {},
+                "created_at": created_at
+            }
+            for row in rows
+        ]
+
+        result = await self._run(
+            lambda: self.client.table("learning_content").insert(data).execute()
+        )
+        return result.data
+
     async def search_content_by_embedding(
         self,
-        query_embedding: List[float],
+        query_embedding: Any,
         limit: int = 10,
-        similarity_threshold: float = 0.7
+        similarity_threshold: float = 0.7,
+        include_content: bool = False
     ) -> List[Dict[str, Any]]:
-        """Search content using vector similarity."""
+        """
+        Search content using vector similarity (numpy array or list query).
+
+        Rows come back without the content blob unless include_content is
+        set; diagnostics only need titles and similarities, so the default
+        keeps the response payload small.
+        """
         # Using Supabase's pgvector similarity search
-        result = self.client.rpc(
-            "match_learning_content",
-            {
-                "query_embedding": query_embedding,
-                "match_threshold": similarity_threshold,
-                "match_count": limit
-            }
-        ).execute()
+        result = await self._run(
+            lambda: self.client.rpc(
+                "match_learning_content",
+                {
+                    "query_embedding": query_embedding.tolist() if hasattr(query_embedding, "tolist") else query_embedding,
+                    "match_threshold": similarity_threshold,
+                    "match_count": limit,
+                    "include_content": include_content
+                }
+            ).execute()
+        )
 
         return result.data
 
@@ -106,16 +185,20 @@ class SupabaseClient:
             "current_week": current_week,
             "current_topics": current_topics,
             "learning_goals": learning_goals,
-            "updated_at": datetime.utcnow().isoformat()
+            "updated_at": _utcnow_iso()
         }
 
         # Upsert - update if exists, insert if not
-        result = self.client.table("user_progress").upsert(data).execute()
+        result = await self._run(
+            lambda: self.client.table("user_progress").upsert(data).execute()
+        )
         return result.data[0] if result.data else {}
 
     async def get_user_progress(self) -> Optional[Dict[str, Any]]:
         """Get current learning progress (single user system)."""
-        result = self.client.table("user_progress").select("*").eq("user_id", "default").execute()
+        result = await self._run(
+            lambda: self.client.table("user_progress").select("*").eq("user_id", "default").execute()
+        )
         return result.data[0] if result.data else None
 
     # Daily Insights Management
@@ -133,10 +216,12 @@ class SupabaseClient:
             "content_id": content_id,
             "relevance_score": relevance_score,
             "week": week,
-            "created_at": datetime.utcnow().isoformat()
+            "created_at": _utcnow_iso()
         }
 
-        result = self.client.table("daily_insights").insert(data).execute()
+        result = await self._run(
+            lambda: self.client.table("daily_insights").insert(data).execute()
+        )
         return result.data[0] if result.data else {}
 
     async def get_daily_insights(
@@ -145,13 +230,53 @@ class SupabaseClient:
         limit: int = 10
     ) -> List[Dict[str, Any]]:
         """Retrieve daily insights (single user system)."""
-        query = self.client.table("daily_insights").select("*").eq("user_id", "default")
+        def run_query():
+            query = self.client.table("daily_insights").select("*").eq("user_id", "default")
+            if date:
+                # Equality on the generated insight_date column hits the
+                # (user_id, insight_date) index; the old string range over
+                # created_at forced a range scan instead
+                query = query.eq("insight_date", date)
+            return query.order("created_at", desc=True).limit(limit).execute()
 
-        if date:
-            # Filter by specific date
-            query = query.gte("created_at", f"{date}T00:00:00").lte("created_at", f"{date}T23:59:59")
+        result = await self._run(run_query)
+        return result.data
 
-        result = query.order("created_at", desc=True).limit(limit).execute()
+    # Diagnostics
+    async def get_content_overview(self, sample_limit: int = 5) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Sample stored content rows plus an exact total count.
+
+        Both ride on one query via count="exact" instead of a separate
+        counting round-trip.
+        """
+        result = await self._run(
+            lambda: self.client.table("learning_content")
+            .select("id, title, created_at", count="exact")
+            .limit(sample_limit)
+            .execute()
+        )
+        return result.data, result.count or 0
+
+    async def has_embedded_content(self) -> bool:
+        """Whether at least one stored row has a non-null embedding."""
+        result = await self._run(
+            lambda: self.client.table("learning_content")
+            .select("id")
+            .not_.is_("embedding", "null")
+            .limit(1)
+            .execute()
+        )
+        return len(result.data) > 0
+
+    async def list_content_titles(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """List stored content ids and titles (diagnostic sampling)."""
+        result = await self._run(
+            lambda: self.client.table("learning_content")
+            .select("id, title")
+            .limit(limit)
+            .execute()
+        )
         return result.data
 
     async def search_insights(
@@ -160,22 +285,27 @@ class SupabaseClient:
         limit: int = 10
     ) -> List[Dict[str, Any]]:
         """Search through past insights using full-text search (single user system)."""
-        result = self.client.table("daily_insights") \
-            .select("*") \
-            .eq("user_id", "default") \
-            .text_search("insight", search_query) \
-            .limit(limit) \
+        result = await self._run(
+            lambda: self.client.table("daily_insights")
+            .select("*")
+            .eq("user_id", "default")
+            .text_search("insight", search_query)
+            .limit(limit)
             .execute()
+        )
 
         return result.data
 
 
-# Singleton instance
+# Singleton instance, double-checked locking for concurrent first requests
 _db_client: Optional[SupabaseClient] = None
+_db_client_lock = threading.Lock()
 
 def get_db_client() -> SupabaseClient:
-    """Get or create Supabase client instance."""
+    """Get or create Supabase client instance (thread-safe)."""
     global _db_client
     if _db_client is None:
-        _db_client = SupabaseClient()
+        with _db_client_lock:
+            if _db_client is None:
+                _db_client = SupabaseClient()
     return _db_client
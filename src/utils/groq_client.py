@@ -2,9 +2,16 @@
 Groq client for generating learning insights and summaries.
 """
 
+import asyncio
+import hashlib
+import json
 import os
-from typing import List, Dict, Any, Optional
-from groq import Groq
+import threading
+from typing import Callable, List, Dict, Any, Optional, Tuple
+import httpx
+import numpy as np
+from cachetools import TTLCache
+from groq import AsyncGroq
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,14 +20,127 @@ load_dotenv()
 class GroqClient:
     """Manages interactions with Groq API for content generation."""
 
+    # Bounds for the prompt-hash response cache; re-issued prompts within
+    # the TTL (e.g. re-generating today's digest) skip the LLM round-trip
+    RESPONSE_CACHE_SIZE = 1024
+    RESPONSE_CACHE_TTL = 86400
+
+    # Near-duplicate prompt reuse: number of recent prompt vectors scanned
+    # on a hash miss, and the cosine similarity needed to count as a hit
+    SEMANTIC_CACHE_SIZE = 256
+    SEMANTIC_SIMILARITY_THRESHOLD = 0.97
+
+    # Connection pool for the API transport; keep-alive sockets skip the
+    # TCP and TLS handshakes on every warm request
+    HTTP_MAX_CONNECTIONS = 100
+    HTTP_KEEPALIVE_CONNECTIONS = 20
+
+    # Insight prompt, split so the user-context header is rendered once per
+    # digest and only the content varies across the N insight calls
+    INSIGHT_HEADER_TEMPLATE = """You are an AI Learning Coach. Based on the following content and the learner's context, generate a concise, actionable learning insight.
+
+Learner Context:
+- Current Week: {current_week}
+- Learning Topics: {topics}
+- Learning Goals: {goals}
+"""
+
+    INSIGHT_BODY_TEMPLATE = """
+Content:
+{content}
+
+Generate a single, focused learning insight that:
+1. Is relevant to their current week and topics
+2. Provides actionable advice or key takeaway
+3. Is appropriate for their learning level
+4. Is concise (2-3 sentences)
+
+IMPORTANT: After your analysis, provide ONLY the final insight text without any thinking process, tags, or explanations.
+
+Insight:"""
+
+    INSIGHT_SYSTEM = "You are an expert AI Learning Coach who creates personalized, actionable learning insights. Provide only the final insight without showing your thinking process."
+
     def __init__(self):
         """Initialize Groq client."""
         api_key = os.getenv("GROQ_API_KEY")
         if not api_key:
             raise ValueError("GROQ_API_KEY must be set in environment")
 
-        self.client = Groq(api_key=api_key)
+        # Async client so concurrent insight calls overlap instead of
+        # blocking the event loop per request; a single long-lived HTTP/2
+        # client lives for the process so completions multiplex over pooled
+        # connections instead of re-handshaking
+        self._http_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=self.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=self.HTTP_KEEPALIVE_CONNECTIONS
+            )
+        )
+        self.client = AsyncGroq(api_key=api_key, http_client=self._http_client)
         self.default_model = "qwen/qwen3-32b"
+        self._response_cache: TTLCache = TTLCache(
+            maxsize=self.RESPONSE_CACHE_SIZE,
+            ttl=self.RESPONSE_CACHE_TTL
+        )
+
+        # Set via set_prompt_embedder; enables near-duplicate prompt reuse
+        self._prompt_embedder: Optional[Callable[[str], Any]] = None
+        self._semantic_keys: List[str] = []
+        self._semantic_matrix: Optional[np.ndarray] = None
+
+    def _response_cache_key(self, model: str, system: str, prompt: str) -> str:
+        """Hash the full request into a response-cache key."""
+        return hashlib.sha256(f"{model}\x00{system}\x00{prompt}".encode()).hexdigest()
+
+    def set_prompt_embedder(self, embedder: Callable[[str], Any]) -> None:
+        """
+        Register a text-to-vector function for semantic cache lookups.
+
+        Injected by the digest generator (which owns the encoder) so this
+        module doesn't import it and create a cycle.
+        """
+        self._prompt_embedder = embedder
+
+    async def _semantic_lookup(self, prompt: str) -> Tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        Look for a cached response to a near-identical prompt.
+
+        Returns (cached response or None, normalized prompt vector). The
+        scan is one matvec over a row-normalized matrix of recent prompt
+        vectors rather than a Python loop over floats.
+        """
+        if self._prompt_embedder is None:
+            return None, None
+
+        embedding = await asyncio.to_thread(self._prompt_embedder, prompt)
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            return None, None
+        vector /= norm
+
+        if self._semantic_matrix is not None and self._semantic_keys:
+            sims = self._semantic_matrix @ vector
+            idx = int(sims.argmax())
+            if sims[idx] >= self.SEMANTIC_SIMILARITY_THRESHOLD:
+                cached = self._response_cache.get(self._semantic_keys[idx])
+                if cached is not None:
+                    return cached, vector
+
+        return None, vector
+
+    def _register_prompt_vector(self, cache_key: str, vector: Optional[np.ndarray]) -> None:
+        """Remember a prompt vector for future semantic lookups."""
+        if vector is None:
+            return
+        row = vector[np.newaxis, :]
+        if self._semantic_matrix is None:
+            self._semantic_matrix = row
+        else:
+            self._semantic_matrix = np.vstack([self._semantic_matrix, row])[-self.SEMANTIC_CACHE_SIZE:]
+        self._semantic_keys = (self._semantic_keys + [cache_key])[-self.SEMANTIC_CACHE_SIZE:]
 
     def _extract_final_output(self, text: str) -> str:
         """
@@ -52,11 +172,31 @@ class GroqClient:
         # No think tags at all, return as-is
         return text.strip()
 
+    def build_insight_header(self, user_context: Dict[str, Any]) -> str:
+        """
+        Render the learner-context portion of the insight prompt.
+
+        The header is identical for every insight in a digest, so callers
+        generating a batch render it once and pass it to generate_insight.
+
+        Args:
+            user_context: User's learning context (week, topics, goals)
+
+        Returns:
+            Rendered prompt header string
+        """
+        return self.INSIGHT_HEADER_TEMPLATE.format(
+            current_week=user_context.get("current_week", 1),
+            topics=", ".join(user_context.get("current_topics", [])),
+            goals=user_context.get("learning_goals", "")
+        )
+
     async def generate_insight(
         self,
         content: str,
-        user_context: Dict[str, Any],
-        max_tokens: int = 500
+        user_context: Optional[Dict[str, Any]] = None,
+        max_tokens: int = 500,
+        context_header: Optional[str] = None
     ) -> str:
         """
         Generate a personalized learning insight from content.
@@ -65,46 +205,72 @@ class GroqClient:
             content: The source content to generate insight from
             user_context: User's learning context (week, topics, goals)
             max_tokens: Maximum tokens for the response
+            context_header: Pre-rendered header from build_insight_header;
+                when set, user_context is not consulted
 
         Returns:
             Generated insight string
         """
-        current_week = user_context.get("current_week", 1)
-        topics = user_context.get("current_topics", [])
-        goals = user_context.get("learning_goals", "")
+        if context_header is None:
+            context_header = self.build_insight_header(user_context or {})
 
-        prompt = f"""You are an AI Learning Coach. Based on the following content and the learner's context, generate a concise, actionable learning insight.
-
-Learner Context:
-- Current Week: {current_week}
-- Learning Topics: {', '.join(topics)}
-- Learning Goals: {goals}
+        prompt = context_header + self.INSIGHT_BODY_TEMPLATE.format(content=content[:1000])
+        system = self.INSIGHT_SYSTEM
 
-Content:
-{content[:1000]}
+        cache_key = self._response_cache_key(self.default_model, system, prompt)
+        cached = self._response_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-Generate a single, focused learning insight that:
-1. Is relevant to their current week and topics
-2. Provides actionable advice or key takeaway
-3. Is appropriate for their learning level
-4. Is concise (2-3 sentences)
+        semantic_hit, prompt_vector = await self._semantic_lookup(prompt)
+        if semantic_hit is not None:
+            return semantic_hit
 
-IMPORTANT: After your analysis, provide ONLY the final insight text without any thinking process, tags, or explanations.
-
-Insight:"""
-
-        response = self.client.chat.completions.create(
+        # Stream so decoding can stop early: the reasoning model spends
+        # most of its token budget inside <think>, and we only pay for
+        # tokens generated before we close the stream
+        stream = await self.client.chat.completions.create(
             model=self.default_model,
             messages=[
-                {"role": "system", "content": "You are an expert AI Learning Coach who creates personalized, actionable learning insights. Provide only the final insight without showing your thinking process."},
+                {"role": "system", "content": system},
                 {"role": "user", "content": prompt}
             ],
             max_tokens=max_tokens,
-            temperature=0.7
+            temperature=0.7,
+            stream=True
         )
 
-        raw_output = response.choices[0].message.content.strip()
-        return self._extract_final_output(raw_output)
+        buffer = ""
+        tail_cap = 600  # chars; the insight itself is only 2-3 sentences
+        close_tag = "</think>"
+        async for chunk in stream:
+            if not chunk.choices or chunk.choices[0].delta.content is None:
+                continue
+            buffer += chunk.choices[0].delta.content
+
+            think_end = buffer.find(close_tag)
+            if think_end == -1:
+                continue
+            tail = buffer[think_end + len(close_tag):]
+            # Stop at a paragraph break inside the answer, or at the cap.
+            # The model emits separator whitespace right after </think>,
+            # so strip it first or the leading "\n\n" would end the answer
+            # before it starts
+            answer = tail.lstrip()
+            if answer and "\n\n" in answer:
+                # Drop whatever fragment of the next paragraph arrived in
+                # the same delta as the break
+                buffer = buffer[:think_end + len(close_tag)] + answer[:answer.index("\n\n")]
+                await stream.close()
+                break
+            if len(tail) >= tail_cap:
+                await stream.close()
+                break
+
+        insight = self._extract_final_output(buffer.strip())
+        self._response_cache[cache_key] = insight
+        self._register_prompt_vector(cache_key, prompt_vector)
+        return insight
 
     async def generate_daily_digest_summary(
         self,
@@ -138,59 +304,139 @@ Write a 2-3 sentence introduction that:
 
 Introduction:"""
 
-        response = self.client.chat.completions.create(
+        system = "You are a supportive AI Learning Coach."
+
+        cache_key = self._response_cache_key(self.default_model, system, prompt)
+        cached = self._response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        response = await self.client.chat.completions.create(
             model=self.default_model,
             messages=[
-                {"role": "system", "content": "You are a supportive AI Learning Coach."},
+                {"role": "system", "content": system},
                 {"role": "user", "content": prompt}
             ],
             max_tokens=150,
             temperature=0.8
         )
 
-        return response.choices[0].message.content.strip()
+        summary = response.choices[0].message.content.strip()
+        self._response_cache[cache_key] = summary
+        return summary
 
-    async def score_content_relevance(
+    async def analyze_content(
         self,
-        content: str,
-        user_topics: List[str]
-    ) -> float:
+        contents: List[str],
+        user_topics: List[str],
+        max_concepts: int = 5
+    ) -> List[Dict[str, Any]]:
         """
-        Score how relevant content is to user's current topics (0.0 to 1.0).
+        Score relevance and extract key concepts for many snippets at once.
+
+        A single JSON-mode completion covers every item and both tasks;
+        the per-call fixed cost (network plus time-to-first-token)
+        dominates these tiny requests, so one fused call for K items
+        replaces 2K separate round-trips.
 
         Args:
-            content: The content to score
+            contents: Content snippets to analyze
             user_topics: User's current learning topics
+            max_concepts: Maximum concepts to extract per snippet
 
         Returns:
-            Relevance score between 0.0 and 1.0
+            One {"score": float, "concepts": List[str]} dict per snippet,
+            in input order
         """
-        prompt = f"""Rate the relevance of this content to the following learning topics on a scale of 0.0 to 1.0.
+        if not contents:
+            return []
 
-Topics: {', '.join(user_topics)}
+        items = "\n\n".join(
+            f"Item {i + 1}:\n{content[:500]}"
+            for i, content in enumerate(contents)
+        )
 
-Content:
-{content[:500]}
+        prompt = f"""For each item below, rate its relevance to the following learning topics on a scale of 0.0 to 1.0 and extract up to {max_concepts} key technical concepts.
 
-Provide only a single number between 0.0 (not relevant) and 1.0 (highly relevant).
+Topics: {', '.join(user_topics)}
+
+{items}
 
-Score:"""
+Respond with a JSON object of the form {{"items": [{{"score": 0.8, "concepts": ["concept one", "concept two"]}}, ...]}} containing exactly {len(contents)} entries, one per item, in item order. Scores range from 0.0 (not relevant) to 1.0 (highly relevant)."""
 
-        response = self.client.chat.completions.create(
-            model="qwen/qwen3-32b",
+        response = await self.client.chat.completions.create(
+            model=self.default_model,
             messages=[
-                {"role": "system", "content": "You are a content relevance evaluator. Respond only with a decimal number."},
+                {"role": "system", "content": "You are a content analyzer. Respond only with a JSON object."},
                 {"role": "user", "content": prompt}
             ],
-            max_tokens=10,
-            temperature=0.3
+            # Budgeted for the JSON alone: reasoning_format="hidden" keeps
+            # the model's <think> block out of the content (and out of the
+            # max_tokens budget), which Groq requires for JSON mode with
+            # reasoning models anyway — otherwise thinking tokens routinely
+            # truncate the payload mid-JSON
+            max_tokens=(16 + 12 * max_concepts) * len(contents) + 32,
+            temperature=0.3,
+            # JSON mode pins the output format so parsing can't fall over
+            # on prose or hallucinated wrappers
+            response_format={"type": "json_object"},
+            reasoning_format="hidden"
         )
 
+        default = {"score": 0.5, "concepts": []}
         try:
-            score = float(response.choices[0].message.content.strip())
-            return max(0.0, min(1.0, score))
-        except ValueError:
-            return 0.5
+            payload = json.loads(response.choices[0].message.content)
+            raw_items = payload["items"] if isinstance(payload, dict) else payload
+            results = [
+                {
+                    "score": max(0.0, min(1.0, float(entry.get("score", 0.5)))),
+                    "concepts": [str(c).strip() for c in entry.get("concepts", [])][:max_concepts]
+                }
+                for entry in raw_items
+            ]
+        except (AttributeError, KeyError, TypeError, ValueError, json.JSONDecodeError):
+            return [dict(default) for _ in contents]
+
+        # Defend against the model returning the wrong count
+        while len(results) < len(contents):
+            results.append(dict(default))
+        return results[:len(contents)]
+
+    async def score_content_relevance_batch(
+        self,
+        contents: List[str],
+        user_topics: List[str]
+    ) -> List[float]:
+        """
+        Score how relevant each content snippet is to user's topics.
+
+        Args:
+            contents: Content snippets to score
+            user_topics: User's current learning topics
+
+        Returns:
+            One score between 0.0 and 1.0 per snippet, in input order
+        """
+        results = await self.analyze_content(contents, user_topics)
+        return [result["score"] for result in results]
+
+    async def score_content_relevance(
+        self,
+        content: str,
+        user_topics: List[str]
+    ) -> float:
+        """
+        Score how relevant content is to user's current topics (0.0 to 1.0).
+
+        Args:
+            content: The content to score
+            user_topics: User's current learning topics
+
+        Returns:
+            Relevance score between 0.0 and 1.0
+        """
+        scores = await self.score_content_relevance_batch([content], user_topics)
+        return scores[0]
 
     async def extract_key_concepts(
         self,
@@ -207,35 +453,19 @@ Score:"""
         Returns:
             List of key concepts
         """
-        prompt = f"""Extract up to {max_concepts} key technical concepts or topics from this content.
-Return them as a comma-separated list.
-
-Content:
-{content[:1000]}
-
-Key Concepts:"""
-
-        response = self.client.chat.completions.create(
-            model="qwen/qwen3-32b",
-            messages=[
-                {"role": "system", "content": "You are a content analyzer. Extract key concepts as a comma-separated list."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=100,
-            temperature=0.3
-        )
-
-        concepts_text = response.choices[0].message.content.strip()
-        concepts = [c.strip() for c in concepts_text.split(",")]
-        return concepts[:max_concepts]
+        results = await self.analyze_content([content], [], max_concepts=max_concepts)
+        return results[0]["concepts"]
 
 
-# Singleton instance
+# Singleton instance, double-checked locking for concurrent first requests
 _groq_client: Optional[GroqClient] = None
+_groq_client_lock = threading.Lock()
 
 def get_groq_client() -> GroqClient:
-    """Get or create Groq client instance."""
+    """Get or create Groq client instance (thread-safe)."""
     global _groq_client
     if _groq_client is None:
-        _groq_client = GroqClient()
+        with _groq_client_lock:
+            if _groq_client is None:
+                _groq_client = GroqClient()
     return _groq_client